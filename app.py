@@ -3,28 +3,52 @@
 
 import streamlit as st
 import requests
+import numpy as np
 import json
 import time
 import random
+import secrets
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import os
-import stripe
+import re
+import threading
+from collections import deque
 from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # stdlib still parses bytes directly, skipping response.text decoding
+    orjson = None
+    _json_loads = json.loads
+
+def _pretty_json(data) -> str:
+    """Two-space indented JSON for display"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(data, indent=2)
 
 # ============= STRIPE CONFIGURATION =============
 STRIPE_PUBLISHABLE_KEY = st.secrets.get("STRIPE_PUBLISHABLE_KEY", "pk_test_...")
 STRIPE_SECRET_KEY = st.secrets.get("STRIPE_SECRET_KEY", "sk_test_...")
-stripe.api_key = STRIPE_SECRET_KEY
 
 # ============= PRICING CONFIGURATION =============
+APPROACH_KEYS = (
+    "precision_mix", "creative_constraints", "parameter_optimization",
+    "unexpected_connections", "dynamic_structure"
+)
+
 PRICING_TIERS = {
     "free": {
         "name": "Free",
         "price": 0,
         "limits": {
             "generations_per_day": 10,
-            "approaches": ["precision_mix", "creative_constraints"],
+            "approaches": ("precision_mix", "creative_constraints"),
             "max_variations": 3,
             "parameter_visibility": False,
             "download_enabled": False
@@ -58,23 +82,31 @@ PRICING_TIERS = {
     }
 }
 
+# "unlimited" is normalized to a numeric sentinel so a limit check is one comparison
+UNLIMITED = float("inf")
+for _config in PRICING_TIERS.values():
+    if _config["limits"]["generations_per_day"] == "unlimited":
+        _config["limits"]["generations_per_day"] = UNLIMITED
+del _config
+
+# Flattened once so hot paths index limits with a single lookup
+_TIER_LIMITS = {tier: config["limits"] for tier, config in PRICING_TIERS.items()}
+
 # ============= USER MANAGEMENT =============
 class UserManager:
     @staticmethod
     def get_user_tier():
-        if 'user_tier' not in st.session_state:
-            st.session_state.user_tier = 'free'
-        return st.session_state.user_tier
+        return st.session_state.setdefault('user_tier', 'free')
     
     @staticmethod
     def get_usage_today():
         # Reset daily usage if new day
-        if 'usage_date' not in st.session_state:
-            st.session_state.usage_date = datetime.now().date()
-            st.session_state.daily_usage = 0
+        today = datetime.now().date()
+        st.session_state.setdefault('usage_date', today)
+        st.session_state.setdefault('daily_usage', 0)
         
-        if st.session_state.usage_date != datetime.now().date():
-            st.session_state.usage_date = datetime.now().date()
+        if st.session_state.usage_date != today:
+            st.session_state.usage_date = today
             st.session_state.daily_usage = 0
         
         return st.session_state.daily_usage
@@ -82,53 +114,56 @@ class UserManager:
     @staticmethod
     def can_generate():
         tier = UserManager.get_user_tier()
-        limit = PRICING_TIERS[tier]['limits']['generations_per_day']
+        limit = _TIER_LIMITS[tier]['generations_per_day']
         current_usage = UserManager.get_usage_today()
         
-        if limit == "unlimited":
+        if current_usage < limit:
             return True, None
         
-        if current_usage >= limit:
-            return False, f"Daily limit reached ({limit} generations)"
-        
-        return True, None
+        return False, f"Daily limit reached ({limit} generations)"
     
     @staticmethod
     def increment_usage():
-        if 'daily_usage' not in st.session_state:
-            st.session_state.daily_usage = 0
-        st.session_state.daily_usage += 1
+        st.session_state.daily_usage = st.session_state.setdefault('daily_usage', 0) + 1
     
     @staticmethod
-    def get_available_approaches():
+    def get_available_approaches() -> tuple:
         tier = UserManager.get_user_tier()
-        approaches_config = PRICING_TIERS[tier]['limits']['approaches']
+        approaches_config = _TIER_LIMITS[tier]['approaches']
         
         if approaches_config == "all":
-            return ["precision_mix", "creative_constraints", "parameter_optimization", 
-                   "unexpected_connections", "dynamic_structure"]
+            return APPROACH_KEYS
         else:
             return approaches_config
     
     @staticmethod
     def get_max_variations():
         tier = UserManager.get_user_tier()
-        return PRICING_TIERS[tier]['limits']['max_variations']
+        return _TIER_LIMITS[tier]['max_variations']
 
 # ============= STRIPE FUNCTIONS =============
+@st.cache_data(ttl=300, show_spinner=False)
+def _create_checkout_url(price_id, user_email):
+    """Create a Stripe checkout URL; re-clicks within 5 minutes reuse it (errors aren't cached)"""
+    # Imported on first checkout: most sessions never reach payment
+    import stripe
+    stripe.api_key = STRIPE_SECRET_KEY
+    
+    app_url = "https://quantum-prompt-optimizer.streamlit.app"  # Update with your URL
+    
+    checkout_session = stripe.checkout.Session.create(
+        payment_method_types=['card'],
+        line_items=[{'price': price_id, 'quantity': 1}],
+        mode='subscription',
+        success_url=f"{app_url}?status=success",
+        cancel_url=f"{app_url}?status=canceled",
+        customer_email=user_email
+    )
+    return checkout_session.url
+
 def create_checkout_session(price_id, user_email):
     try:
-        app_url = "https://quantum-prompt-optimizer.streamlit.app"  # Update with your URL
-        
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{'price': price_id, 'quantity': 1}],
-            mode='subscription',
-            success_url=f"{app_url}?status=success",
-            cancel_url=f"{app_url}?status=canceled",
-            customer_email=user_email
-        )
-        return checkout_session.url
+        return _create_checkout_url(price_id, user_email)
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return None
@@ -162,47 +197,196 @@ def show_pricing_modal():
                 st.rerun()
 
 # ============= QUANTUM RANDOM SERVICE (Same as before) =============
+class QuantumSourceError(Exception):
+    """A random source answered but did not return usable bytes"""
+
 class QuantumRandomService:
+    HEDGE_DELAY = 0.3  # seconds to wait on ANU before racing Random.org
+    REQUEST_TIMEOUT = (1.0, 2.0)  # (connect, read)
+    FETCH_DEADLINE = 5.0  # overall cap on one fetch, hedge and adapter retries included
+    
+    # Failures that mean "try another source"; anything else is a bug and propagates
+    SOURCE_ERRORS = (requests.exceptions.RequestException, ValueError, QuantumSourceError)
+    
+    POOL_REFILL_BYTES = 1024  # ANU's per-request maximum
+    POOL_LOW_WATER = 256
+    REFILL_BACKOFF = 30.0  # seconds to wait after a failed refill before trying again
+    
     def __init__(self):
         self.api_calls_count = 0
+        self._count_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        
+        # Prefetched bytes, one entry per fetch so each keeps its source label
+        self._pool = deque()
+        self._pool_size = 0
+        self._pool_lock = threading.Lock()
+        self._refilling = False
+        self._refill_retry_at = 0.0
+        
+        # One pooled session so repeated fetches reuse the TCP/TLS connection
+        self.session = requests.Session()
+        # Only transient connection/read errors are retried here. Error statuses
+        # (including 429 with Retry-After) return at once so the hedge fails over.
+        retry = Retry(
+            total=2, connect=2, read=1, status=0, backoff_factor=0.2,
+            allowed_methods=frozenset(["GET"]),
+            respect_retry_after_header=False
+        )
+        self.session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
         
     def get_quantum_random(self, num_bytes: int = 10) -> Dict:
+        return self.get_quantum_random_batch(num_bytes)
+    
+    def get_quantum_random_batch(self, num_bytes: int) -> Dict:
+        """Get num_bytes for a whole batch of variations in one draw
+        
+        Served from the prefetch pool, fetching directly only when it runs dry.
+        """
+        with self._pool_lock:
+            result = self._take_from_pool(num_bytes)
+        
+        if result is None:
+            result = self._fetch_batch(num_bytes)
+        
+        self._maybe_refill_pool()
+        return result
+    
+    def _take_from_pool(self, num_bytes: int) -> Optional[Dict]:
+        # Caller holds _pool_lock. A draw is served from a single entry so its source
+        # label describes every byte; tails too short for this draw are dropped.
+        while self._pool and len(self._pool[0]["random_bytes"]) < num_bytes:
+            self._pool_size -= len(self._pool.popleft()["random_bytes"])
+        if not self._pool:
+            return None
+        
+        entry = self._pool[0]
+        taken = entry["random_bytes"][:num_bytes]
+        del entry["random_bytes"][:num_bytes]
+        if not entry["random_bytes"]:
+            self._pool.popleft()
+        
+        self._pool_size -= num_bytes
+        return {
+            "random_bytes": list(taken),
+            "source": entry["source"],
+            "true_quantum": entry["true_quantum"]
+        }
+    
+    def _maybe_refill_pool(self):
+        with self._pool_lock:
+            if self._refilling or self._pool_size >= self.POOL_LOW_WATER:
+                return
+            if time.monotonic() < self._refill_retry_at:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill_pool, daemon=True).start()
+    
+    def _refill_pool(self):
+        # Nobody is waiting on a refill, so ask one source at a time instead of hedging.
+        # No secure-random fallback here: the pool only holds bytes from a real source.
+        batch = None
         try:
-            return self._get_anu_quantum(num_bytes)
-        except:
-            try:
-                return self._get_random_org(num_bytes)
-            except:
-                return self._get_secure_random(num_bytes)
+            for fetch in (self._get_anu_quantum, self._get_random_org):
+                try:
+                    batch = fetch(self.POOL_REFILL_BYTES)
+                    break
+                except self.SOURCE_ERRORS:
+                    continue
+            
+            with self._pool_lock:
+                if batch is None:
+                    self._refill_retry_at = time.monotonic() + self.REFILL_BACKOFF
+                else:
+                    self._pool.append({**batch, "random_bytes": bytearray(batch["random_bytes"])})
+                    self._pool_size += len(batch["random_bytes"])
+        finally:
+            with self._pool_lock:
+                self._refilling = False
+    
+    def _fetch_batch(self, num_bytes: int) -> Dict:
+        """Fetch num_bytes in a single request (ANU accepts up to 1024 uint8)
+        
+        ANU is tried first; if it hasn't answered within HEDGE_DELAY (or has
+        already failed) Random.org is fired in parallel and the first success wins.
+        If both fail, or neither answers within FETCH_DEADLINE, returns secure
+        random bytes.
+        """
+        deadline = time.monotonic() + self.FETCH_DEADLINE
+        pending = {self._executor.submit(self._get_anu_quantum, num_bytes)}
+        hedged = False
+        
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(
+                pending,
+                timeout=remaining if hedged else min(self.HEDGE_DELAY, remaining),
+                return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                if not isinstance(error, self.SOURCE_ERRORS):
+                    raise error
+            
+            if not hedged:
+                pending.add(self._executor.submit(self._get_random_org, num_bytes))
+                hedged = True
+        
+        # Out of time: drop queued attempts; running ones finish within their own timeouts
+        for straggler in pending:
+            straggler.cancel()
+        return self._get_secure_random(num_bytes)
+    
+    def _record_api_call(self):
+        # Shared across sessions and fetch threads, so guard the increment
+        with self._count_lock:
+            self.api_calls_count += 1
     
     def _get_anu_quantum(self, num_bytes: int) -> Dict:
         url = "https://qrng.anu.edu.au/API/jsonI.php"
         params = {"length": num_bytes, "type": "uint8"}
-        
-        response = requests.get(url, params=params, timeout=5)
-        data = response.json()
-        
-        if not data.get("success", False):
-            raise Exception("ANU API error")
+        headers = {"Accept": "application/json"}
+        
+        response = self.session.get(url, params=params, headers=headers, timeout=self.REQUEST_TIMEOUT)
+        # Rate-limit and error pages fail here, before the body is parsed
+        response.raise_for_status()
+        data = _json_loads(response.content)
+        
+        if not isinstance(data, dict) or not data.get("success", False):
+            raise QuantumSourceError("ANU API error")
+        values = data.get("data")
+        if not isinstance(values, list) or len(values) != num_bytes:
+            raise QuantumSourceError("ANU returned a malformed or short read")
+        if not all(type(v) is int and 0 <= v <= 255 for v in values):
+            raise QuantumSourceError("ANU returned values outside uint8")
             
-        self.api_calls_count += 1
+        self._record_api_call()
         
         return {
-            "random_bytes": data["data"],
+            "random_bytes": values,
             "source": "🔬 ANU Quantum Lab",
             "true_quantum": True
         }
     
     def _get_random_org(self, num_bytes: int) -> Dict:
-        url = "https://www.random.org/integers/"
-        params = {
-            "num": num_bytes, "min": 0, "max": 255,
-            "col": 1, "base": 10, "format": "plain"
-        }
+        # Raw byte endpoint: the body is the bytes themselves, no text parsing needed
+        url = "https://www.random.org/cgi-bin/randbyte"
+        params = {"nbytes": num_bytes, "format": "f"}
         
-        response = requests.get(url, params=params, timeout=5)
-        numbers = [int(x) for x in response.text.strip().split('\n') if x]
-        self.api_calls_count += 1
+        response = self.session.get(url, params=params, timeout=self.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        numbers = list(response.content)
+        
+        if len(numbers) != num_bytes:
+            raise QuantumSourceError("Random.org returned a short read")
+            
+        self._record_api_call()
         
         return {
             "random_bytes": numbers,
@@ -211,50 +395,108 @@ class QuantumRandomService:
         }
     
     def _get_secure_random(self, num_bytes: int) -> Dict:
-        import secrets
         return {
-            "random_bytes": [secrets.randbits(8) for _ in range(num_bytes)],
+            "random_bytes": list(secrets.token_bytes(num_bytes)),
             "source": "🔒 Secure Random",
             "true_quantum": False
         }
 
 # ============= QUANTUM ENHANCED OPTIMIZER (Same as before) =============
+_PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# Prompt templates, parsed once and filled with format_map
+_PRECISION_TMPL = """You are a {role} with {style} thinking style.
+
+Calibration Parameters:
+• Technical Level: {technical}
+• Creativity Level: {creativity}
+• Detail Level: {detail}
+
+Communication tone: {tone}
+
+Task: {prompt}"""
+
+_CONSTRAINTS_TMPL = """{prompt}
+
+Creative Constraints:
+{constraint_lines}"""
+
 class QuantumEnhancedOptimizer:
+    # 1 byte picks the approach; _quantum_creative_constraints reads the most
+    # of the rest (indices up to 13), so 16 covers every approach
+    BYTES_PER_VARIATION = 16
+    
+    # Static vocabularies live on the class as tuples, shared by every instance
+    COMPONENTS = {
+        "roles": (
+            "expert", "teacher", "researcher", "critic", "analyst",
+            "philosopher", "scientist", "artist", "engineer", "storyteller",
+            "detective", "journalist", "therapist", "coach", "strategist"
+        ),
+        "thinking_styles": (
+            "analytical", "creative", "systematic", "intuitive", "logical",
+            "holistic", "critical", "lateral", "convergent", "divergent"
+        ),
+        "communication_tones": (
+            "formal", "casual", "academic", "conversational", "professional",
+            "friendly", "authoritative", "empathetic", "objective", "passionate"
+        ),
+        "domains": (
+            "cooking", "sports", "music", "nature", "technology", "art",
+            "mathematics", "philosophy", "psychology", "physics", "biology",
+            "economics", "history", "literature", "cinema", "architecture"
+        ),
+        "aspects": (
+            "practical applications", "theoretical foundations", "historical context",
+            "future implications", "ethical considerations", "common misconceptions",
+            "real-world examples", "underlying principles", "potential risks"
+        )
+    }
+    
+    # Direct handles on the pools _quantum_precision_mix picks from, with lengths precomputed
+    _ROLES = COMPONENTS["roles"]
+    _TONES = COMPONENTS["communication_tones"]
+    _STYLES = COMPONENTS["thinking_styles"]
+    _N_ROLES, _N_TONES, _N_STYLES = len(_ROLES), len(_TONES), len(_STYLES)
+    
+    APPROACHES = {
+        "precision_mix": "Quantum-Calibrated Parameters",
+        "creative_constraints": "Quantum Creative Constraints",
+        "parameter_optimization": "Quantum Parameter Optimization",
+        "unexpected_connections": "Quantum Cross-Domain Fusion",
+        "dynamic_structure": "Quantum Structure Generation"
+    }
+    
+    _AUDIENCES = ("a curious child", "a skeptical expert", "someone from 1800s")
+    _EMOTIONS = ("curious", "playful", "serious")
+    
+    _VAR_POOLS = {
+        "domain": COMPONENTS["domains"],
+        "audience": _AUDIENCES,
+        "emotion": _EMOTIONS,
+        "aspect": COMPONENTS["aspects"]
+    }
+    
+    # Constraint templates are parsed once; each keeps the placeholders it needs
+    _CONSTRAINT_TEMPLATES = tuple(
+        (template, tuple(_PLACEHOLDER_RE.findall(template)))
+        for template in (
+            "using analogies from {domain}",
+            "as if explaining to {audience}",
+            "with {emotion} undertone",
+            "focusing on {aspect}"
+        )
+    )
+    
     def __init__(self):
         self.qrng = QuantumRandomService()
         
-        self.components = {
-            "roles": [
-                "expert", "teacher", "researcher", "critic", "analyst",
-                "philosopher", "scientist", "artist", "engineer", "storyteller",
-                "detective", "journalist", "therapist", "coach", "strategist"
-            ],
-            "thinking_styles": [
-                "analytical", "creative", "systematic", "intuitive", "logical",
-                "holistic", "critical", "lateral", "convergent", "divergent"
-            ],
-            "communication_tones": [
-                "formal", "casual", "academic", "conversational", "professional",
-                "friendly", "authoritative", "empathetic", "objective", "passionate"
-            ],
-            "domains": [
-                "cooking", "sports", "music", "nature", "technology", "art",
-                "mathematics", "philosophy", "psychology", "physics", "biology",
-                "economics", "history", "literature", "cinema", "architecture"
-            ],
-            "aspects": [
-                "practical applications", "theoretical foundations", "historical context",
-                "future implications", "ethical considerations", "common misconceptions",
-                "real-world examples", "underlying principles", "potential risks"
-            ]
-        }
-        
-        self.approaches = {
-            "precision_mix": "Quantum-Calibrated Parameters",
-            "creative_constraints": "Quantum Creative Constraints",
-            "parameter_optimization": "Quantum Parameter Optimization",
-            "unexpected_connections": "Quantum Cross-Domain Fusion",
-            "dynamic_structure": "Quantum Structure Generation"
+        self._dispatch = {
+            "precision_mix": self._quantum_precision_mix,
+            "creative_constraints": self._quantum_creative_constraints,
+            "parameter_optimization": self._quantum_parameter_optimization,
+            "unexpected_connections": self._quantum_unexpected_connections,
+            "dynamic_structure": self._quantum_dynamic_structure
         }
     
     def generate_variations(self, base_prompt: str, num_variations: int = 5) -> List[Dict]:
@@ -262,30 +504,29 @@ class QuantumEnhancedOptimizer:
         variations = []
         available_approaches = UserManager.get_available_approaches()
         
+        # One round trip for the whole batch, sliced per variation below
+        chunk = self.BYTES_PER_VARIATION
+        quantum_data = self.qrng.get_quantum_random_batch(num_bytes=chunk * num_variations)
+        
+        # One row per variation: byte 0 picks the approach (for every row in a single
+        # vectorized modulo), the rest feeds the approach method as plain ints
+        batch = np.asarray(quantum_data["random_bytes"], dtype=np.uint8).reshape(num_variations, chunk)
+        approach_indices = (batch[:, 0] % len(available_approaches)).tolist()
+        method_bytes = batch[:, 1:].tolist()
+        
         for i in range(num_variations):
-            quantum_data = self.qrng.get_quantum_random(num_bytes=100)
-            quantum_bytes = quantum_data["random_bytes"]
-            
-            # Select approach from available ones
-            approach_idx = quantum_bytes[0] % len(available_approaches)
-            approach = available_approaches[approach_idx]
+            quantum_bytes = method_bytes[i]
+            approach = available_approaches[approach_indices[i]]
             
             # Generate variation based on approach
-            if approach == "precision_mix":
-                result = self._quantum_precision_mix(base_prompt, quantum_bytes[1:])
-            elif approach == "creative_constraints":
-                result = self._quantum_creative_constraints(base_prompt, quantum_bytes[1:])
-            elif approach == "parameter_optimization":
-                result = self._quantum_parameter_optimization(base_prompt, quantum_bytes[1:])
-            elif approach == "unexpected_connections":
-                result = self._quantum_unexpected_connections(base_prompt, quantum_bytes[1:])
-            else:
-                result = self._quantum_dynamic_structure(base_prompt, quantum_bytes[1:])
+            result = self._dispatch[approach](base_prompt, quantum_bytes)
             
+            approach_name = self.APPROACHES[approach]
             variations.append({
                 "id": i + 1,
+                "title": f"Variation {i + 1}: {approach_name}",
                 "prompt": result["prompt"],
-                "approach": self.approaches[approach],
+                "approach": approach_name,
                 "parameters": result["parameters"],
                 "quantum_source": quantum_data["source"],
                 "quantum_verified": quantum_data["true_quantum"],
@@ -296,31 +537,26 @@ class QuantumEnhancedOptimizer:
     
     # [Include all the quantum methods from the previous version]
     def _quantum_precision_mix(self, prompt: str, quantum_bytes: List[int]) -> Dict:
-        technical_level = quantum_bytes[0] / 255
-        creativity_level = quantum_bytes[1] / 255
-        detail_level = quantum_bytes[2] / 255
+        # Formatted once and shared by the prompt text and the parameters dict
+        technical = f"{quantum_bytes[0] / 255:.1%}"
+        creativity = f"{quantum_bytes[1] / 255:.1%}"
+        detail = f"{quantum_bytes[2] / 255:.1%}"
         
-        role = self.components["roles"][quantum_bytes[4] % len(self.components["roles"])]
-        tone = self.components["communication_tones"][quantum_bytes[5] % len(self.components["communication_tones"])]
-        style = self.components["thinking_styles"][quantum_bytes[6] % len(self.components["thinking_styles"])]
+        role = self._ROLES[quantum_bytes[4] % self._N_ROLES]
+        tone = self._TONES[quantum_bytes[5] % self._N_TONES]
+        style = self._STYLES[quantum_bytes[6] % self._N_STYLES]
         
-        optimized = f"""You are a {role} with {style} thinking style.
-
-Calibration Parameters:
-• Technical Level: {technical_level:.1%}
-• Creativity Level: {creativity_level:.1%}
-• Detail Level: {detail_level:.1%}
-
-Communication tone: {tone}
-
-Task: {prompt}"""
+        optimized = _PRECISION_TMPL.format_map({
+            "role": role, "style": style, "tone": tone, "prompt": prompt,
+            "technical": technical, "creativity": creativity, "detail": detail
+        })
         
         return {
             "prompt": optimized,
             "parameters": {
-                "technical": f"{technical_level:.1%}",
-                "creativity": f"{creativity_level:.1%}",
-                "detail": f"{detail_level:.1%}",
+                "technical": technical,
+                "creativity": creativity,
+                "detail": detail,
                 "role": role, "tone": tone, "style": style
             },
             "description": f"Precision-calibrated {role} perspective"
@@ -330,37 +566,18 @@ Task: {prompt}"""
         num_constraints = (quantum_bytes[0] % 3) + 2
         constraints = []
         
-        constraint_templates = [
-            "using analogies from {domain}",
-            "as if explaining to {audience}",
-            "with {emotion} undertone",
-            "focusing on {aspect}"
-        ]
-        
         for i in range(num_constraints):
-            template = constraint_templates[quantum_bytes[1+i] % len(constraint_templates)]
+            template, fields = self._CONSTRAINT_TEMPLATES[quantum_bytes[1+i] % len(self._CONSTRAINT_TEMPLATES)]
             
-            if "{domain}" in template:
-                domain = self.components["domains"][quantum_bytes[10+i] % len(self.components["domains"])]
-                template = template.replace("{domain}", domain)
-            elif "{audience}" in template:
-                audiences = ["a curious child", "a skeptical expert", "someone from 1800s"]
-                audience = audiences[quantum_bytes[10+i] % len(audiences)]
-                template = template.replace("{audience}", audience)
-            elif "{emotion}" in template:
-                emotions = ["curious", "playful", "serious"]
-                emotion = emotions[quantum_bytes[10+i] % len(emotions)]
-                template = template.replace("{emotion}", emotion)
-            elif "{aspect}" in template:
-                aspect = self.components["aspects"][quantum_bytes[10+i] % len(self.components["aspects"])]
-                template = template.replace("{aspect}", aspect)
+            values = {}
+            for field in fields:
+                pool = self._VAR_POOLS[field]
+                values[field] = pool[quantum_bytes[10+i] % len(pool)]
             
-            constraints.append(template)
+            constraints.append(template.format_map(values))
         
-        optimized = f"""{prompt}
-
-Creative Constraints:
-{chr(10).join(f"• {c}" for c in constraints)}"""
+        constraint_lines = "\n".join([f"• {c}" for c in constraints])
+        optimized = _CONSTRAINTS_TMPL.format_map({"prompt": prompt, "constraint_lines": constraint_lines})
         
         return {
             "prompt": optimized,
@@ -393,6 +610,70 @@ Creative Constraints:
             "description": "Dynamic structure"
         }
 
+@st.cache_resource
+def get_optimizer() -> QuantumEnhancedOptimizer:
+    """One optimizer (and pooled HTTP session) shared by all sessions"""
+    return QuantumEnhancedOptimizer()
+
+def _variation_title(variation: Dict) -> str:
+    # Variations kept in sessions from before titles were stored have no "title" key
+    return variation.get("title") or f"Variation {variation['id']}: {variation['approach']}"
+
+def build_download_payload(variations: List[Dict]) -> str:
+    """Join all variations into the text served by the download button"""
+    return "\n\n---\n\n".join([
+        f"{_variation_title(v)}\n\n{v['prompt']}"
+        for v in variations
+    ])
+
+def render_variation(variation: Dict, show_parameters: bool):
+    """Render one variation inside its expander"""
+    with st.expander(_variation_title(variation), expanded=(variation['id'] == 1)):
+        # Quantum badge
+        if variation["quantum_verified"]:
+            st.success(f"✅ TRUE Quantum - {variation['quantum_source']}")
+        else:
+            st.warning(f"⚡ Physical Random - {variation['quantum_source']}")
+        
+        # Show prompt
+        st.code(variation["prompt"], language=None)
+        
+        # Show parameters (Pro only)
+        if show_parameters:
+            st.markdown("**Quantum Parameters:**")
+            params_str = _pretty_json(variation["parameters"])
+            st.code(params_str, language="json")
+        else:
+            st.info("🔒 Upgrade to Pro to see all parameters")
+        
+        st.caption(f"💡 {variation['description']}")
+
+# ============= STYLES =============
+_CSS = """
+<style>
+    .stButton > button {
+        width: 100%;
+        background-color: #6366f1;
+        color: white;
+    }
+    .usage-warning {
+        background-color: #fef3c7;
+        border: 1px solid #f59e0b;
+        border-radius: 8px;
+        padding: 12px;
+        margin: 8px 0;
+    }
+    .pro-badge {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        color: white;
+        padding: 4px 12px;
+        border-radius: 20px;
+        font-size: 12px;
+        margin-left: 8px;
+    }
+</style>
+"""
+
 # ============= MAIN STREAMLIT APP =============
 def main():
     st.set_page_config(
@@ -402,31 +683,8 @@ def main():
         initial_sidebar_state="expanded"
     )
     
-    # Custom CSS
-    st.markdown("""
-    <style>
-        .stButton > button {
-            width: 100%;
-            background-color: #6366f1;
-            color: white;
-        }
-        .usage-warning {
-            background-color: #fef3c7;
-            border: 1px solid #f59e0b;
-            border-radius: 8px;
-            padding: 12px;
-            margin: 8px 0;
-        }
-        .pro-badge {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 4px 12px;
-            border-radius: 20px;
-            font-size: 12px;
-            margin-left: 8px;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    # Custom CSS (re-emitted every run: Streamlit drops elements a rerun doesn't repeat)
+    st.markdown(_CSS, unsafe_allow_html=True)
     
     # Check URL parameters for Stripe
     query_params = st.query_params
@@ -440,10 +698,7 @@ def main():
             st.query_params.clear()
     
     # Initialize session state
-    if 'optimizer' not in st.session_state:
-        st.session_state.optimizer = QuantumEnhancedOptimizer()
-    if 'generation_count' not in st.session_state:
-        st.session_state.generation_count = 0
+    st.session_state.setdefault('generation_count', 0)
     
     # Show upgrade modal if requested
     if st.session_state.get('show_pricing', False):
@@ -464,9 +719,9 @@ def main():
             st.markdown(f"Plan: **{tier_name}**")
         
         usage = UserManager.get_usage_today()
-        limit = PRICING_TIERS[tier]['limits']['generations_per_day']
+        limit = _TIER_LIMITS[tier]['generations_per_day']
         
-        if limit != "unlimited":
+        if limit != UNLIMITED:
             st.metric("Daily Usage", f"{usage}/{limit}")
             progress = min(usage / limit, 1.0)
             st.progress(progress)
@@ -551,7 +806,7 @@ def main():
                 st.session_state.show_pricing = True
                 st.rerun()
         else:
-            remaining = PRICING_TIERS[tier]['limits']['generations_per_day'] - usage
+            remaining = _TIER_LIMITS[tier]['generations_per_day'] - usage
             if tier == 'free' and remaining > 0:
                 st.caption(f"You have {remaining} generations remaining today")
         
@@ -562,8 +817,11 @@ def main():
             disabled=not user_prompt or not can_generate
         ):
             with st.spinner("🌌 Accessing quantum random sources..."):
+                # Built on first use so read-only visits never construct it
+                optimizer = get_optimizer()
+                
                 # Generate variations
-                variations = st.session_state.optimizer.generate_variations(
+                variations = optimizer.generate_variations(
                     user_prompt,
                     num_variations
                 )
@@ -573,7 +831,9 @@ def main():
                 
                 # Store results
                 st.session_state.variations = variations
+                st.session_state.download_payload = build_download_payload(variations)
                 st.session_state.original_prompt = user_prompt
+                st.session_state.gen_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 st.session_state.generation_count += 1
                 
                 st.success(f"✅ Generated {num_variations} quantum-optimized variations!")
@@ -583,45 +843,24 @@ def main():
         
         if 'variations' in st.session_state and st.session_state.variations:
             # Download button (Pro only)
-            if PRICING_TIERS[tier]['limits']['download_enabled']:
-                all_prompts = "\n\n---\n\n".join([
-                    f"Variation {v['id']}: {v['approach']}\n\n{v['prompt']}"
-                    for v in st.session_state.variations
-                ])
-                
+            if _TIER_LIMITS[tier]['download_enabled']:
+                # Sessions from before these keys existed only have the variations
+                if st.session_state.get('download_payload') is None:
+                    st.session_state.download_payload = build_download_payload(st.session_state.variations)
+                timestamp = st.session_state.setdefault('gen_timestamp', datetime.now().strftime('%Y%m%d_%H%M%S'))
                 st.download_button(
                     label="📥 Download All Variations",
-                    data=all_prompts,
-                    file_name=f"quantum_prompts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                    data=st.session_state.download_payload,
+                    file_name=f"quantum_prompts_{timestamp}.txt",
                     mime="text/plain"
                 )
             else:
                 st.info("🔒 Upgrade to Pro to download variations")
             
             # Display variations
+            show_parameters = _TIER_LIMITS[tier]['parameter_visibility']
             for variation in st.session_state.variations:
-                with st.expander(
-                    f"Variation {variation['id']}: {variation['approach']}", 
-                    expanded=(variation['id'] == 1)
-                ):
-                    # Quantum badge
-                    if variation["quantum_verified"]:
-                        st.success(f"✅ TRUE Quantum - {variation['quantum_source']}")
-                    else:
-                        st.warning(f"⚡ Physical Random - {variation['quantum_source']}")
-                    
-                    # Show prompt
-                    st.code(variation["prompt"], language=None)
-                    
-                    # Show parameters (Pro only)
-                    if PRICING_TIERS[tier]['limits']['parameter_visibility']:
-                        st.markdown("**Quantum Parameters:**")
-                        params_str = json.dumps(variation["parameters"], indent=2)
-                        st.code(params_str, language="json")
-                    else:
-                        st.info("🔒 Upgrade to Pro to see all parameters")
-                    
-                    st.caption(f"💡 {variation['description']}")
+                render_variation(variation, show_parameters)
         else:
             st.info("👈 Enter a prompt and generate variations!")
             